@@ -2,13 +2,15 @@ package asr
 
 import (
 	"bytes"
-	"encoding/base64"
+	"encoding/binary"
 	"encoding/json"
 	"fmt"
 	"io"
 	"lingzhi-server/log"
 	"lingzhi-server/model"
 	"net/http"
+	"net/url"
+	"strconv"
 	"sync"
 	"time"
 )
@@ -74,12 +76,6 @@ func Init() error {
 	return nil
 }
 
-// ASRRequest 表示发送到ASR服务的请求
-type ASRRequest struct {
-	AudioData []string               `json:"audio_data"` // base64编码的音频数据
-	Config    map[string]interface{} `json:"config"`
-}
-
 // ASRResponse 表示从ASR服务接收的响应
 type ASRResponse struct {
 	Status string `json:"status"`
@@ -148,39 +144,29 @@ func AddAudioData(conn *model.ConnectionState, audioData []byte) {
 //   - string: 识别结果文本
 //   - error: 处理过程中的错误
 func (a *ASRProcessor) callASRService(conn *model.ConnectionState) (string, error) {
-	// 准备请求数据
-	var base64Audios []string
+	// 准备请求数据：每个Opus帧前加4字节小端长度
+	var reqBody bytes.Buffer
+	lengthPrefix := make([]byte, 4)
 	for _, chunk := range conn.ASRAudio {
-		base64Audios = append(base64Audios, base64.StdEncoding.EncodeToString(chunk))
-	}
-
-	// 构建请求配置
-	config := map[string]interface{}{
-		"SessionId":     conn.SessionId,
-		"channel_count": a.config.ChannelCount,
-		"language":      a.config.Language,
+		binary.LittleEndian.PutUint32(lengthPrefix, uint32(len(chunk)))
+		reqBody.Write(lengthPrefix)
+		reqBody.Write(chunk)
 	}
 
-	// 创建请求体
-	requestBody := ASRRequest{
-		AudioData: base64Audios,
-		Config:    config,
-	}
-
-	// 序列化请求体
-	jsonData, err := json.Marshal(requestBody)
-	if err != nil {
-		return "", fmt.Errorf("序列化ASR请求失败: %v", err)
-	}
+	// 构建请求配置，通过查询参数传递
+	query := url.Values{}
+	query.Set("SessionId", conn.SessionId)
+	query.Set("channel_count", strconv.Itoa(a.config.ChannelCount))
+	query.Set("language", a.config.Language)
 
 	// 创建HTTP请求
-	req, err := http.NewRequest("POST", a.config.ASRServerURL, bytes.NewBuffer(jsonData))
+	req, err := http.NewRequest("POST", a.config.ASRServerURL+"?"+query.Encode(), &reqBody)
 	if err != nil {
 		return "", fmt.Errorf("创建ASR HTTP请求失败: %v", err)
 	}
 
 	// 设置请求头
-	req.Header.Set("Content-Type", "application/json")
+	req.Header.Set("Content-Type", "application/octet-stream")
 
 	// 发送请求
 	resp, err := a.client.Do(req)
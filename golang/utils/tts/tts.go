@@ -2,13 +2,14 @@ package tts
 
 import (
 	"bytes"
-	"encoding/base64"
+	"encoding/binary"
 	"encoding/json"
 	"fmt"
 	"io"
 	"lingzhi-server/config"
 	"lingzhi-server/log"
 	"net/http"
+	"strconv"
 )
 
 var client = &http.Client{}
@@ -19,15 +20,6 @@ type TTSRequest struct {
 	Config map[string]interface{} `json:"config"` // 配置参数
 }
 
-// TTSResponse 表示从TTS服务接收的响应
-type TTSResponse struct {
-	Status        string   `json:"status"`         // 状态，如 "success" 或 "error"
-	AudioData     []string `json:"audio_data"`     // base64编码的音频数据列表
-	Duration      float64  `json:"duration"`       // 音频持续时间（秒）
-	Format        string   `json:"format"`         // 音频格式，如 "opus"
-	FrameDuration int      `json:"frame_duration"` // 每帧持续时间（毫秒）
-}
-
 // ProcessTTS 处理文本到语音转换
 // 参数:
 //   - text: 要转换为语音的文本
@@ -93,39 +85,50 @@ func callTTSService(url string, text string, sessionId string) ([][]byte, float6
 	}
 	defer resp.Body.Close()
 
-	// 读取响应
-	body, err := io.ReadAll(resp.Body)
-	if err != nil {
-		return nil, 0, fmt.Errorf("读取TTS响应失败: %v", err)
-	}
-
 	// 检查HTTP状态码
 	if resp.StatusCode != http.StatusOK {
+		body, _ := io.ReadAll(resp.Body)
 		return nil, 0, fmt.Errorf("TTS服务返回错误状态码: %d, 响应: %s", resp.StatusCode, string(body))
 	}
 
-	// 解析响应
-	var ttsResponse TTSResponse
-	if err := json.Unmarshal(body, &ttsResponse); err != nil {
-		return nil, 0, fmt.Errorf("解析TTS响应失败: %v", err)
+	// 音频持续时间在响应头中返回
+	duration, err := strconv.ParseFloat(resp.Header.Get("X-Audio-Duration"), 64)
+	if err != nil {
+		log.Warnf("解析TTS音频时长失败: %v", err)
+		duration = 0
 	}
 
-	// 检查响应状态
-	if ttsResponse.Status != "success" {
-		return nil, 0, fmt.Errorf("TTS服务返回错误状态: %s", ttsResponse.Status)
+	// 按长度前缀读取原始Opus帧
+	audioFrames, err := readFrames(resp.Body)
+	if err != nil {
+		return nil, 0, fmt.Errorf("读取TTS音频帧失败: %v", err)
 	}
 
-	// 解码base64音频数据
-	audioFrames := make([][]byte, len(ttsResponse.AudioData))
-	for i, frameBase64 := range ttsResponse.AudioData {
-		frameData, err := base64.StdEncoding.DecodeString(frameBase64)
-		if err != nil {
-			return nil, 0, fmt.Errorf("解码base64音频数据失败: %v", err)
+	return audioFrames, duration, nil
+}
+
+// readFrames 读取长度前缀格式的音频帧（每帧前4字节小端长度）
+// 参数:
+//   - r: 响应体
+//
+// 返回:
+//   - [][]byte: Opus音频帧列表
+//   - error: 读取过程中的错误
+func readFrames(r io.Reader) ([][]byte, error) {
+	var audioFrames [][]byte
+	lengthPrefix := make([]byte, 4)
+	for {
+		if _, err := io.ReadFull(r, lengthPrefix); err != nil {
+			if err == io.EOF {
+				return audioFrames, nil
+			}
+			return nil, err
 		}
 
-		// 直接存储原始Opus帧数据
-		audioFrames[i] = frameData
+		frame := make([]byte, binary.LittleEndian.Uint32(lengthPrefix))
+		if _, err := io.ReadFull(r, frame); err != nil {
+			return nil, err
+		}
+		audioFrames = append(audioFrames, frame)
 	}
-
-	return audioFrames, ttsResponse.Duration, nil
 }
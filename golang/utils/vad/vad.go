@@ -2,13 +2,14 @@ package vad
 
 import (
 	"bytes"
-	"encoding/base64"
 	"encoding/json"
 	"fmt"
 	"io"
 	"lingzhi-server/log"
 	"lingzhi-server/model"
 	"net/http"
+	"net/url"
+	"strconv"
 	"sync"
 	"time"
 
@@ -100,12 +101,6 @@ func IsVAD(conn *model.ConnectionState, audioData []byte) bool {
 	return haveVoice
 }
 
-// VADRequest 表示发送到VAD服务的请求
-type VADRequest struct {
-	AudioData string                 `json:"audio_data"` // base64编码的音频数据
-	Config    map[string]interface{} `json:"config"`
-}
-
 // VADResponse 表示从VAD服务接收的响应
 type VADResponse struct {
 	Status string `json:"status"`
@@ -217,30 +212,19 @@ func (v *VADProcessor) callVADService(audioData []byte) (bool, error) {
 		audioData = append(audioData, padding...)
 	}
 
-	// 准备请求数据
-	reqData := VADRequest{
-		// 对音频数据进行base64编码
-		AudioData: base64.StdEncoding.EncodeToString(audioData),
-		Config: map[string]interface{}{
-			"sample_rate": v.config.SampleRate,
-			"frame_size":  v.config.FrameSize,
-		},
-	}
-
-	// 将请求数据转换为JSON
-	reqBody, err := json.Marshal(reqData)
-	if err != nil {
-		return false, err
-	}
+	// 配置通过查询参数传递，音频数据直接作为二进制请求体发送
+	query := url.Values{}
+	query.Set("sample_rate", strconv.Itoa(v.config.SampleRate))
+	query.Set("frame_size", strconv.Itoa(v.config.FrameSize))
 
 	// 创建HTTP请求
-	req, err := http.NewRequest("POST", v.config.VADServerURL, bytes.NewBuffer(reqBody))
+	req, err := http.NewRequest("POST", v.config.VADServerURL+"?"+query.Encode(), bytes.NewReader(audioData))
 	if err != nil {
 		return false, err
 	}
 
 	// 设置请求头
-	req.Header.Set("Content-Type", "application/json")
+	req.Header.Set("Content-Type", "application/octet-stream")
 
 	// 发送请求
 	resp, err := v.client.Do(req)
@@ -1,16 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 import sys
 import os
 import asyncio
+import traceback
+import uvicorn
 from typing import Optional, Dict, Any
 from fastapi.responses import StreamingResponse
+import orjson
+import torch
 
 # Add parent directory to Python path to import core modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from core.utils import asr, vad, llm, tts 
-from core.utils.util import is_segment, get_string_no_punctuation_or_emoji
+from core.utils.coalesce import RequestCoalescer
+from core.utils.registry import registry
+from core.utils.util import is_segment, get_string_no_punctuation_or_emoji, pack_frame, unpack_frames, iterate_in_thread
 from config.logger import setup_logging
 from config.settings import load_config
 
@@ -19,6 +25,12 @@ logger = setup_logging()
 
 # Global instances
 instances: Dict[str, Any] = {}
+# 每个模块的并发上限，阻塞调用通过 asyncio.to_thread 在线程池中执行
+semaphores: Dict[str, asyncio.Semaphore] = {}
+# 未配置时的默认并发数：VAD/ASR 共享同一个有状态的本地模型实例，只能串行调用
+DEFAULT_CONCURRENCY = {"VAD": 1, "ASR": 1}
+# 合并相同文本的并发TTS请求
+tts_coalescer = RequestCoalescer()
 
 # Initialize instances on startup
 @app.on_event("startup")
@@ -27,6 +39,10 @@ async def startup_event():
     global instances
     config = load_config()
     try:
+        concurrency = config.get("concurrency", {})
+        for name in ("VAD", "ASR", "LLM", "TTS"):
+            semaphores[name.lower()] = asyncio.Semaphore(concurrency.get(name, DEFAULT_CONCURRENCY.get(name, os.cpu_count() or 1)))
+
         instances['vad'] = vad.create_instance(
             config["selected_module"]["VAD"],
             config["VAD"][config["selected_module"]["VAD"]]
@@ -51,18 +67,32 @@ async def startup_event():
             config["TTS"][config["selected_module"]["TTS"]],
             config["delete_audio"]
         )
+        # 所有模型加载完成后再设置PyTorch线程数：silero_vad 导入时和 FunASR 构建模型时都会修改该值
+        torch_threads = config.get("torch_threads", 0)
+        if torch_threads:
+            torch.set_num_threads(torch_threads)
+        logger.bind(tag="startup").info(f"PyTorch threads: {torch.get_num_threads()}")
         logger.bind(tag="startup").info("All instances initialized successfully on startup")
     except Exception as e:
         logger.error(f"Failed to initialize instances on startup: {str(e)}")
         raise e
 
-class ProcessRequest(BaseModel):
-    audio_data: str  # base64编码的音频数据
-    config: dict
-
-class ASRProcessRequest(BaseModel):
-    audio_data: list[str]  # base64编码的音频数据
-    config: dict
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release resources held by processing instances"""
+    for name, instance in instances.items():
+        try:
+            aclose = getattr(instance, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            close = getattr(instance, "close", None)
+            if close is not None:
+                close()
+        except Exception as e:
+            logger.bind(tag="shutdown").error(f"Failed to close {name} instance: {str(e)}")
+    # 已关闭的实例不能再复用，同一进程内再次启动时需要重新创建
+    instances.clear()
+    registry.clear()
 
 class TextRequest(BaseModel):
     text: str
@@ -73,64 +103,74 @@ class LLMRequest(BaseModel):
     config: dict
 
 @app.post("/vad")
-async def process_vad(request: ProcessRequest):
-    """Process audio with VAD"""
+async def process_vad(request: Request):
+    """Process audio with VAD
+
+    请求体为原始PCM数据(application/octet-stream)，配置通过查询参数传递
+    """
     if 'vad' not in instances:
         raise HTTPException(status_code=500, detail="VAD instance not initialized")
     try:
-        # 解码base64音频数据
-        import base64
-        import traceback
-        
-        # logger.bind(tag="vad_api").debug(f"接收VAD请求，配置: {request.config}")
-        
-        try:
-            audio_data = base64.b64decode(request.audio_data)
-            # logger.bind(tag="vad_api").debug(f"成功解码base64数据，长度: {len(audio_data)}字节")
-        except Exception as e:
-            logger.bind(tag="vad_api").error(f"Base64解码失败: {str(e)}")
-            raise HTTPException(status_code=400, detail=f"Invalid base64 data: {str(e)}")
-        
+        audio_data = await request.body()
+        if len(audio_data) == 0:
+            logger.bind(tag="vad_api").error("VAD请求音频数据为空")
+            raise HTTPException(status_code=400, detail="Empty audio data")
+
+        # logger.bind(tag="vad_api").debug(f"接收VAD请求，长度: {len(audio_data)}字节")
+
         # 将请求配置传递给VAD实例
-        result = instances['vad'].is_vad(audio_data, request.config)
+        async with semaphores['vad']:
+            result = await asyncio.to_thread(instances['vad'].is_vad, audio_data, dict(request.query_params))
         # logger.bind(tag="vad_api").debug(f"VAD检测结果: {result}")
-        
+
         return {"status": "success", "result": result}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.bind(tag="vad_api").error(f"VAD处理错误: {str(e)}")
         logger.bind(tag="vad_api").error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/asr")
-async def process_asr(request: ASRProcessRequest):
-    """Process audio with ASR"""
+async def process_asr(request: Request):
+    """Process audio with ASR
+
+    请求体为长度前缀的Opus帧序列(每帧前4字节小端长度)，配置通过查询参数传递
+    """
     if 'asr' not in instances:
         raise HTTPException(status_code=500, detail="ASR instance not initialized")
     try:
-        logger.bind(tag="asr_api").debug(f"接收ASR请求，配置: {request.config}")
-        audio_data_decoded = []
-        for data in request.audio_data:
-            # 解码base64音频数据
-            import base64
-            import traceback
-            
-            try:
-                audio_data = base64.b64decode(data)
-                audio_data_decoded.append(audio_data)
-                # logger.bind(tag="asr_api").debug(f"成功解码base64数据，长度: {len(audio_data)}字节")
-            except Exception as e:
-                logger.bind(tag="asr_api").error(f"Base64解码失败: {str(e)}")
-                raise HTTPException(status_code=400, detail=f"Invalid base64 data: {str(e)}")
-            
-        # 将请求配置传递给ASR实例   
-        result, file_path = await instances['asr'].speech_to_text(audio_data_decoded, request.config['SessionId'])
+        config = dict(request.query_params)
+        logger.bind(tag="asr_api").debug(f"接收ASR请求，配置: {config}")
+
+        try:
+            audio_data = unpack_frames(await request.body())
+        except ValueError as e:
+            logger.bind(tag="asr_api").error(f"音频帧解析失败: {str(e)}")
+            raise HTTPException(status_code=400, detail=f"Invalid audio frames: {str(e)}")
+
+        # 将请求配置传递给ASR实例
+        async with semaphores['asr']:
+            result, file_path = await instances['asr'].speech_to_text(audio_data, config.get('SessionId', 'default_session'))
         logger.bind(tag="asr_api").debug(f"ASR处理结果: {result}")
         return {"status": "success", "text": result}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.bind(tag="asr_api").error(f"ASR处理错误: {str(e)}")
         logger.bind(tag="asr_api").error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+def ndjson_line(data: dict) -> bytes:
+    """序列化为一行JSON（换行分隔的JSON格式）"""
+    return orjson.dumps(data) + b"\n"
+
+async def stream_llm_response(session_id, dialogue):
+    """异步迭代LLM响应，并限制LLM并发数"""
+    async with semaphores['llm']:
+        async for chunk in instances['llm'].aresponse(session_id, dialogue):
+            yield chunk
+
 @app.post("/llm")
 async def process_llm(request: LLMRequest):
     """Process text with LLM and stream the results"""
@@ -158,61 +198,56 @@ async def process_llm(request: LLMRequest):
                 session_id = request.config.get("SessionId", "default_session")
                 logger.bind(tag="llm_api").info(f"处理LLM请求: session={session_id}, text={request.dialogue[:]}...")
                 
-                # 调用LLM处理文本，这会返回一个生成器
-                llm_response_generator = instances['llm'].response(session_id, dialogue)
+                # 调用LLM处理文本，这会返回一个异步生成器
+                llm_response_generator = stream_llm_response(session_id, dialogue)
                 
                 # 跟踪是否收到了任何响应
                 received_any_response = False
+                # 完整响应的所有chunk，只在结束时拼接一次
                 full_response = []
-                start = 0
+                # 尚未发送的chunk，每次发送分段后清空
+                pending = []
                 
                 # 生成JSON行响应
-                for chunk in llm_response_generator:
-                    # 处理特殊字符，确保JSON格式正确
+                async for chunk in llm_response_generator:
                     full_response.append(chunk)
+                    pending.append(chunk)
 
                     if is_segment(chunk):
-                        segment_text = "".join(full_response[start:])
-                        segment_text = segment_text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-                        segment_text = get_string_no_punctuation_or_emoji(segment_text)
+                        segment_text = get_string_no_punctuation_or_emoji("".join(pending))
                         if len(segment_text) > 0:
                             received_any_response = True
                             logger.bind(tag="llm_api").info(f"LLM流式响应: {segment_text}")
-                            yield f'{{"status": "streaming", "chunk": "{segment_text}"}}\n'
-                            start = len(full_response)
+                            yield ndjson_line({"status": "streaming", "chunk": segment_text})
+                            pending.clear()
 
                 # 处理剩余的响应
-                if start < len(full_response):
-                    segment_text = "".join(full_response[start:])
-                    segment_text = segment_text.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-                    segment_text = get_string_no_punctuation_or_emoji(segment_text)
+                if pending:
+                    segment_text = get_string_no_punctuation_or_emoji("".join(pending))
                     if len(segment_text) > 0:
                         received_any_response = True
                         logger.bind(tag="llm_api").info(f"LLM剩余流式响应: {segment_text}")
-                        yield f'{{"status": "streaming", "chunk": "{segment_text}"}}\n'
+                        yield ndjson_line({"status": "streaming", "chunk": segment_text})
+
+                full_response = "".join(full_response)
 
                 # 记录完整响应
                 if received_any_response:
                     logger.bind(tag="llm_api").info(f"LLM响应完成: session={session_id}, 长度={len(full_response)}")
-                    full_response = "".join(full_response[:])
                     logger.bind(tag="llm_api").debug(f"LLM完整响应: {full_response}...")
                 else:
                     logger.bind(tag="llm_api").warning(f"LLM没有返回任何响应: session={session_id}")
-                    yield '{"status": "warning", "message": "未收到LLM响应"}\n'
+                    yield ndjson_line({"status": "warning", "message": "未收到LLM响应"})
                 
                 # 发送完成信号
-                res = full_response
-                yield f'{{"status": "complete", "message": "{res}"}}\n'
+                yield ndjson_line({"status": "complete", "message": full_response})
                 
             except Exception as e:
-                import traceback
                 error_msg = str(e)
                 logger.bind(tag="llm_api").error(f"LLM处理错误: {error_msg}")
                 logger.bind(tag="llm_api").error(traceback.format_exc())
                 
-                # 处理错误消息中的特殊字符
-                error_msg_escaped = error_msg.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
-                yield f'{{"status": "error", "message": "{error_msg_escaped}"}}\n'
+                yield ndjson_line({"status": "error", "message": error_msg})
         
         # 返回流式响应
         return StreamingResponse(
@@ -221,49 +256,69 @@ async def process_llm(request: LLMRequest):
         )
         
     except Exception as e:
-        import traceback
         logger.bind(tag="llm_api").error(f"LLM API错误: {str(e)}")
         logger.bind(tag="llm_api").error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
+async def synthesize_tts(tts_instance, text):
+    """在线程池中合成语音，并限制TTS并发数"""
+    async with semaphores['tts']:
+        return await asyncio.to_thread(tts_instance.synthesize, text)
+
 @app.post("/tts")
 async def process_tts(request: TextRequest):
-    """Process text with TTS and return base64 encoded audio data"""
+    """Process text with TTS and stream length-prefixed opus frames"""
     if 'tts' not in instances:
         raise HTTPException(status_code=500, detail="TTS instance not initialized")
     try:
         logger.bind(tag="tts_api").debug(f"接收TTS请求，文本: {request.text[:]}...")
-        
-        # 调用 TTS 处理文本
-        opus_data, duration = instances['tts'].to_tts(request.text)
-        
-        if opus_data is None:
-            logger.bind(tag="tts_api").error(f"TTS处理失败: 未能生成音频")
-            raise HTTPException(status_code=500, detail="Failed to generate TTS audio")
-        
-        # 将 opus 数据编码为 base64
-        import base64
-        
-        # 将每个 opus 帧编码为 base64 并添加到列表中
-        base64_frames = []
-        for frame in opus_data:
-            # 编码每一帧
-            frame_base64 = base64.b64encode(frame).decode('utf-8')
-            base64_frames.append(frame_base64)
-        
-        logger.bind(tag="tts_api").debug(f"TTS处理成功，音频长度: {duration:.2f}秒，帧数: {len(base64_frames)}")
-        
-        # 返回 base64 编码的音频数据列表和持续时间
-        return {
-            "status": "success", 
-            "audio_data": base64_frames,
-            "duration": duration,
-            "format": "opus",
-            "frame_duration": 60  # 与 TTS 模块中的帧持续时间保持一致
-        }
+
+        tts_instance = instances['tts']
+        result = tts_instance.get_cached_tts(request.text)
+        # 缓存命中时 Opus 帧已经编码完成
+        cached = result is not None
+        if not cached:
+            # 调用 TTS 合成语音，相同文本的并发请求只调用一次上游服务；Opus 帧在发送时才逐帧编码
+            pcm = await tts_coalescer.run(
+                tts_instance.cache_key(request.text),
+                lambda: synthesize_tts(tts_instance, request.text)
+            )
+            if pcm is None:
+                logger.bind(tag="tts_api").error(f"TTS处理失败: 未能生成音频")
+                raise HTTPException(status_code=500, detail="Failed to generate TTS audio")
+            raw_data, duration = pcm
+            result = tts_instance.stream_opus(request.text, raw_data, duration), duration
+        opus_frames, duration = result
+
+        logger.bind(tag="tts_api").debug(f"TTS合成成功，音频长度: {duration:.2f}秒")
+
+        async def generate_frames():
+            frame_count = 0
+            if cached:
+                # 直接输出缓存的帧，不必每帧都切换到线程池
+                for frame in opus_frames:
+                    frame_count += 1
+                    yield pack_frame(frame)
+            else:
+                async for frame in iterate_in_thread(opus_frames):
+                    frame_count += 1
+                    yield pack_frame(frame)
+            logger.bind(tag="tts_api").debug(f"TTS音频发送完成，帧数: {frame_count}")
+
+        # 每个 opus 帧前加 4 字节小端长度后直接输出，元信息放在响应头中
+        return StreamingResponse(
+            generate_frames(),
+            media_type="application/octet-stream",
+            headers={
+                "X-Audio-Duration": f"{duration}",
+                "X-Audio-Format": "opus",
+                "X-Frame-Duration": "60",  # 与 TTS 模块中的帧持续时间保持一致
+            }
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.bind(tag="tts_api").error(f"TTS处理错误: {str(e)}")
-        import traceback
         logger.bind(tag="tts_api").error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -272,5 +327,10 @@ async def check_healthy():
     return {"status": "success", "message": "I'm healthy!"}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8001)
+    # WORKERS 大于 1 时启动多个worker进程，每个进程在 startup 中各自加载一份模型，
+    # CPU 密集的请求可以分散到多个核上，但内存占用随worker数线性增长
+    workers = int(os.getenv("WORKERS", "1"))
+    if workers > 1:
+        uvicorn.run("api:app", host="127.0.0.1", port=8001, workers=workers)
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8001)
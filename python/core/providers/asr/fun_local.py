@@ -1,5 +1,6 @@
 import time
 import wave
+import asyncio
 import os
 import sys
 import io
@@ -81,12 +82,13 @@ class ASRProvider(ASRProviderBase):
         try:
             # 保存音频文件
             start_time = time.time()
-            file_path = self.save_audio_to_file(opus_data, session_id)
+            file_path = await asyncio.to_thread(self.save_audio_to_file, opus_data, session_id)
             logger.bind(tag=TAG).debug(f"音频文件保存耗时: {time.time() - start_time:.3f}s | 路径: {file_path}")
 
             # 语音识别
             start_time = time.time()
-            result = self.model.generate(
+            result = await asyncio.to_thread(
+                self.model.generate,
                 input=file_path,
                 cache={},
                 language="auto",
@@ -1,8 +1,23 @@
 from abc import ABC, abstractmethod
 
+from core.utils.util import iterate_in_thread
+
 
 class LLMProviderBase(ABC):
     @abstractmethod
     def response(self, session_id, dialogue):
         """LLM response generator"""
         pass
+
+    async def aresponse(self, session_id, dialogue):
+        """LLM async response generator，默认在线程池中推进同步的 response"""
+        async for chunk in iterate_in_thread(self.response(session_id, dialogue)):
+            yield chunk
+
+    def close(self):
+        """释放连接等资源"""
+        pass
+
+    async def aclose(self):
+        """释放异步连接等资源"""
+        pass
@@ -1,58 +1,100 @@
 from config.logger import setup_logging
-import requests, json
+import httpx
+import orjson
 from core.providers.llm.base import LLMProviderBase
 
 TAG = __name__
 logger = setup_logging()
 
 
+def filter_think_tag(content, is_active):
+    """过滤 <think> 与 </think> 之间的内容，返回 (可输出的内容, 当前是否在标签外)"""
+    # 绝大多数chunk不含标签，只有出现 "think>" 时才做拆分
+    if "think>" in content:
+        # 处理标签跨多个chunk的情况
+        if '<think>' in content:
+            is_active = False
+            content = content.split('<think>')[0]
+        if '</think>' in content:
+            is_active = True
+            content = content.split('</think>')[-1]
+    return content, is_active
+
+
 class LLMProvider(LLMProviderBase):
     def __init__(self, config):
 
         self.model_name = config.get("model_name")
         self.base_url = config.get("base_url", "http://localhost:11434")
+        # 复用连接池，避免每次请求重新建立TCP连接
+        timeout = httpx.Timeout(config.get("timeout", 120.0))
+        limits = httpx.Limits(max_connections=512, max_keepalive_connections=256)
+        self.client = httpx.Client(timeout=timeout, limits=limits)
+        self.async_client = httpx.AsyncClient(timeout=timeout, limits=limits)
 
-    def response(self, session_id, dialogue):        
-        try:
-            # Convert dialogue format to Ollama format
-            prompt = ""
-            for msg in dialogue:
-                if msg["role"] == "system":
-                    prompt += f"System: {msg['content']}\n"
-                elif msg["role"] == "user":
-                    prompt += f"User: {msg['content']}\n"
-                elif msg["role"] == "assistant":
-                    prompt += f"Assistant: {msg['content']}\n"
-
-            logger.bind(tag=TAG).info(f"Ollama prompt: {prompt}")
+    def build_request(self, dialogue):
+        """Convert dialogue format to Ollama generate request"""
+        prompt = ""
+        for msg in dialogue:
+            if msg["role"] == "system":
+                prompt += f"System: {msg['content']}\n"
+            elif msg["role"] == "user":
+                prompt += f"User: {msg['content']}\n"
+            elif msg["role"] == "assistant":
+                prompt += f"Assistant: {msg['content']}\n"
+
+        logger.bind(tag=TAG).info(f"Ollama prompt: {prompt}")
 
+        return {
+            "model": self.model_name,
+            "prompt": prompt,
+            "stream": True
+        }
+
+    def response(self, session_id, dialogue):
+        try:
             # Make request to Ollama API
-            response = requests.post(
+            with self.client.stream(
+                "POST",
                 f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model_name,
-                    "prompt": prompt,
-                    "stream": True
-                },
-                stream=True
-            )
+                json=self.build_request(dialogue)
+            ) as response:
+                is_active = True
+                for line in response.iter_lines():
+                    if line:
+                        json_response = orjson.loads(line)
+                        if "response" in json_response:
+                            content, is_active = filter_think_tag(json_response["response"], is_active)
+                            if is_active:
+                                yield content
 
-            is_active = True
-            for line in response.iter_lines():
-                if line:
-                    json_response = json.loads(line)
-                    if "response" in json_response:
-                        content = json_response["response"]
-                         # 处理标签跨多个chunk的情况
-                        if '<think>' in content:
-                            is_active = False
-                            content = content.split('<think>')[0]
-                        if '</think>' in content:
-                            is_active = True
-                            content = content.split('</think>')[-1]
-                        if is_active:
-                            yield content
+        except Exception as e:
+            logger.bind(tag=TAG).error(f"Error in Ollama response generation: {e}")
+            yield "【Ollama服务响应异常】"
+
+    async def aresponse(self, session_id, dialogue):
+        try:
+            # Make request to Ollama API
+            async with self.async_client.stream(
+                "POST",
+                f"{self.base_url}/api/generate",
+                json=self.build_request(dialogue)
+            ) as response:
+                is_active = True
+                async for line in response.aiter_lines():
+                    if line:
+                        json_response = orjson.loads(line)
+                        if "response" in json_response:
+                            content, is_active = filter_think_tag(json_response["response"], is_active)
+                            if is_active:
+                                yield content
 
         except Exception as e:
             logger.bind(tag=TAG).error(f"Error in Ollama response generation: {e}")
             yield "【Ollama服务响应异常】"
+
+    def close(self):
+        self.client.close()
+
+    async def aclose(self):
+        await self.async_client.aclose()
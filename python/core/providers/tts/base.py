@@ -6,31 +6,165 @@ import opuslib_next
 from pydub import AudioSegment
 from abc import ABC, abstractmethod
 import io
+import queue
+import struct
+import hashlib
+from contextlib import contextmanager
+from core.utils.cache import TTLCache
 
 TAG = __name__
 logger = setup_logging()
 
+# Opus编码器的输入格式：16kHz、单声道、16位
+OPUS_SAMPLE_RATE = 16000
+OPUS_CHANNELS = 1
+OPUS_SAMPLE_WIDTH = 2
+OPUS_FRAME_DURATION = 60  # 60ms per frame
+OPUS_FRAME_SIZE = int(OPUS_SAMPLE_RATE * OPUS_FRAME_DURATION / 1000)  # 960 samples/frame
+
+
+def parse_wav(data):
+    """直接解析WAV头，返回 (采样率, 声道数, 采样字节数, PCM数据的memoryview)；不是PCM格式的WAV时返回 None"""
+    if len(data) < 12:
+        return None
+    riff, _, wave_id = struct.unpack_from("<4sI4s", data, 0)
+    if riff != b"RIFF" or wave_id != b"WAVE":
+        return None
+
+    offset = 12
+    fmt = None
+    while offset + 8 <= len(data):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", data, offset)
+        offset += 8
+        if chunk_id == b"fmt ":
+            if chunk_size < 16:
+                return None
+            audio_format, channels, sample_rate, _, _, bits_per_sample = struct.unpack_from("<HHIIHH", data, offset)
+            if audio_format != 1:  # 1 = PCM
+                return None
+            fmt = (sample_rate, channels, bits_per_sample // 8)
+        elif chunk_id == b"data":
+            if fmt is None:
+                return None
+            # 流式生成的WAV常把data长度写为0或占位的最大值，此时取到数据末尾；返回 memoryview 避免复制
+            end = offset + chunk_size
+            if chunk_size == 0 or end > len(data):
+                end = len(data)
+            return (*fmt, memoryview(data)[offset:end])
+        offset += chunk_size + (chunk_size & 1)  # chunk按2字节对齐
+    return None
+
 
 class TTSProviderBase(ABC):
     def __init__(self, config, delete_audio_file):
         self.delete_audio_file = delete_audio_file
         # self.output_file = config.get("output_file")
+        # 复用Opus编码器，避免每次合成都重新分配编码器状态
+        self._encoder_pool = queue.SimpleQueue()
+        # 缓存常用短语的合成结果 (Opus帧, 时长)，cache_size 为 0 时关闭
+        self.tts_cache = TTLCache(config.get("cache_size", 256), config.get("cache_ttl", 3600))
+
+    def cache_key(self, text):
+        """缓存键：音色 + 文本摘要"""
+        return getattr(self, "voice", None), hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
 
     def to_tts(self, text):
+        """合成语音并一次性返回 (Opus帧列表, 时长)，失败时返回 None"""
+        cached = self.get_cached_tts(text)
+        if cached is not None:
+            frames, duration = cached
+            return list(frames), duration
+        result = self.synthesize(text)
+        if result is None:
+            return None
+        raw_data, duration = result
         try:
-            origin_data = self.text_to_speak(text)
-            data, duration = self.origin_data_to_opus_data(origin_data)
+            data = list(self.stream_opus(text, raw_data, duration))
             logger.bind(tag=TAG).info(f"Generated data length: {len(data)}, text: {text[:]}")
             return data, duration
         except Exception as e:
             logger.bind(tag=TAG).info(f"Failed to generate TTS file: {e}")
             return None
 
+    def get_cached_tts(self, text):
+        """返回缓存的 (Opus帧迭代器, 时长)，未命中时返回 None"""
+        cached = self.tts_cache.get(self.cache_key(text))
+        if cached is None:
+            return None
+        logger.bind(tag=TAG).debug(f"TTS缓存命中, text: {text[:]}")
+        return iter(cached[0]), cached[1]
+
+    def synthesize(self, text):
+        """调用TTS服务合成语音并转换为PCM，返回 (PCM数据, 时长)，失败时返回 None"""
+        try:
+            origin_data = self.text_to_speak(text)
+            raw_data, duration = self.origin_data_to_pcm(origin_data)
+            logger.bind(tag=TAG).info(f"Generated audio duration: {duration:.2f}s, text: {text[:]}")
+            return raw_data, duration
+        except Exception as e:
+            logger.bind(tag=TAG).info(f"Failed to generate TTS file: {e}")
+            return None
+
+    def stream_opus(self, text, raw_data, duration):
+        """返回逐帧编码的Opus帧生成器，全部输出完成后写入缓存"""
+        return self.cache_opus_frames(self.cache_key(text), self.iter_opus_frames(raw_data), duration)
+
+    def cache_opus_frames(self, key, frames, duration):
+        """边输出边收集Opus帧，全部输出完成后写入缓存；中途中断则不缓存"""
+        collected = []
+        for frame in frames:
+            collected.append(frame)
+            yield frame
+        self.tts_cache.put(key, (tuple(collected), duration))
+
     @abstractmethod
     def text_to_speak(self, text):
         pass
 
-    def origin_data_to_opus_data(self, origin_data):
+    def close(self):
+        """释放连接等资源"""
+        pass
+
+    @contextmanager
+    def opus_encoder(self):
+        """从编码器池借出一个Opus编码器，用完后重置状态并归还，避免上一段音频影响下一次编码"""
+        try:
+            encoder = self._encoder_pool.get_nowait()
+        except queue.Empty:
+            encoder = opuslib_next.Encoder(OPUS_SAMPLE_RATE, OPUS_CHANNELS, opuslib_next.APPLICATION_AUDIO)
+        try:
+            yield encoder
+        finally:
+            encoder.reset_state()
+            self._encoder_pool.put(encoder)
+
+    def iter_opus_frames(self, raw_data):
+        """逐帧生成Opus数据；同一段语音使用同一个编码器顺序编码，保证帧间连续"""
+        with self.opus_encoder() as encoder:
+            for frame in self.split_frames(raw_data):
+                yield encoder.encode(frame.tobytes(), OPUS_FRAME_SIZE)
+
+    @staticmethod
+    def split_frames(raw_data):
+        """按帧切分PCM数据；完整帧均为原始缓冲区上的视图，只有不足一帧的末尾会复制到补零的新帧中"""
+        samples = np.frombuffer(raw_data, dtype=np.int16)
+        full_length = len(samples) - len(samples) % OPUS_FRAME_SIZE
+        frames = list(samples[:full_length].reshape(-1, OPUS_FRAME_SIZE))
+        if full_length < len(samples):
+            last_frame = np.zeros(OPUS_FRAME_SIZE, dtype=np.int16)
+            last_frame[:len(samples) - full_length] = samples[full_length:]
+            frames.append(last_frame)
+        return frames
+
+    def origin_data_to_pcm(self, origin_data):
+        """将合成的WAV数据转换为16kHz单声道16位PCM，返回 (PCM数据, 时长)"""
+        wav = parse_wav(origin_data)
+        if wav is not None and wav[:3] == (OPUS_SAMPLE_RATE, OPUS_CHANNELS, OPUS_SAMPLE_WIDTH):
+            # 已经是16kHz单声道16位PCM，直接使用data块，无需经过pydub解码
+            raw_data = wav[3]
+            raw_data = raw_data[:len(raw_data) - len(raw_data) % OPUS_SAMPLE_WIDTH]
+            duration = len(raw_data) / (OPUS_SAMPLE_RATE * OPUS_SAMPLE_WIDTH)
+            return raw_data, duration
 
         # 二进制数据，直接从二进制数据创建 AudioSegment
         audio = AudioSegment.from_file(io.BytesIO(origin_data), format="wav")
@@ -38,34 +172,16 @@ class TTSProviderBase(ABC):
         duration = len(audio) / 1000.0
 
         # 转换为单声道和16kHz采样率（确保与编码器匹配）
-        audio = audio.set_channels(1).set_frame_rate(16000)
+        audio = audio.set_channels(OPUS_CHANNELS).set_frame_rate(OPUS_SAMPLE_RATE).set_sample_width(OPUS_SAMPLE_WIDTH)
 
         # 获取原始PCM数据（16位小端）
-        raw_data = audio.raw_data
-
-        # 初始化Opus编码器
-        encoder = opuslib_next.Encoder(16000, 1, opuslib_next.APPLICATION_AUDIO)
-
-        # 编码参数
-        frame_duration = 60  # 60ms per frame
-        frame_size = int(16000 * frame_duration / 1000)  # 960 samples/frame
+        return audio.raw_data, duration
 
-        opus_datas = []
-        # 按帧处理所有音频数据（包括最后一帧可能补零）
-        for i in range(0, len(raw_data), frame_size * 2):  # 16bit=2bytes/sample
-            # 获取当前帧的二进制数据
-            chunk = raw_data[i:i + frame_size * 2]
-
-            # 如果最后一帧不足，补零
-            if len(chunk) < frame_size * 2:
-                chunk += b'\x00' * (frame_size * 2 - len(chunk))
-
-            # 转换为numpy数组处理
-            np_frame = np.frombuffer(chunk, dtype=np.int16)
+    def origin_data_to_opus_data(self, origin_data):
+        raw_data, duration = self.origin_data_to_pcm(origin_data)
 
-            # 编码Opus数据
-            opus_data = encoder.encode(np_frame.tobytes(), frame_size)
-            opus_datas.append(opus_data)
+        # 编码Opus数据
+        opus_datas = list(self.iter_opus_frames(raw_data))
 
         logger.bind(tag=TAG).info(f"opus_datas Generated data length: {len(opus_datas)}")
         return opus_datas, duration
@@ -2,7 +2,7 @@ import os
 import uuid
 import json
 import base64
-import requests
+import httpx
 from datetime import datetime
 from core.providers.tts.base import TTSProviderBase
 
@@ -14,10 +14,17 @@ class TTSProvider(TTSProviderBase):
         self.access_token = config.get("access_token")
         self.cluster = config.get("cluster")
         self.voice = config.get("voice")
+        # 直接请求16kHz采样率，与Opus编码器一致，可跳过重采样
+        self.rate = config.get("rate", 16000)
 
         self.host = "openspeech.bytedance.com"
         self.api_url = f"https://{self.host}/api/v1/tts"
         self.header = {"Authorization": f"Bearer;{self.access_token}"}
+        # 复用连接池，避免每次合成都重新进行TLS握手
+        self.client = httpx.Client(
+            timeout=httpx.Timeout(config.get("timeout", 30.0)),
+            limits=httpx.Limits(max_connections=512, max_keepalive_connections=256)
+        )
 
     # def generate_filename(self, extension=".wav"):
     #     return os.path.join(self.output_file, f"tts-{datetime.now().date()}@{uuid.uuid4().hex}{extension}")
@@ -35,6 +42,7 @@ class TTSProvider(TTSProviderBase):
             "audio": {
                 "voice_type": self.voice,
                 "encoding": "wav",
+                "rate": self.rate,
                 "speed_ratio": 1.0,
                 "volume_ratio": 1.0,
                 "pitch_ratio": 1.0,
@@ -50,7 +58,7 @@ class TTSProvider(TTSProviderBase):
         }
 
         try:
-            resp = requests.post(self.api_url, json.dumps(request_json), headers=self.header)
+            resp = self.client.post(self.api_url, content=json.dumps(request_json), headers=self.header)
             if "data" in resp.json():
                 data = resp.json()["data"]
                 return base64.b64decode(data)
@@ -58,3 +66,6 @@ class TTSProvider(TTSProviderBase):
                 raise Exception(f"{__name__} status_code: {resp.status_code} response: {resp.content}")
         except Exception as e:
             raise Exception(f"{__name__} error: {e}")
+
+    def close(self):
+        self.client.close()
@@ -8,6 +8,7 @@ import uuid
 from abc import ABC, abstractmethod
 from typing import Optional, Tuple, List
 from core.providers.asr.base import ASRProviderBase
+from core.utils.registry import registry
 from config.logger import setup_logging
 
 TAG = __name__
@@ -19,6 +20,6 @@ def create_instance(class_name: str, *args, **kwargs) -> ASRProviderBase:
         lib_name = f'core.providers.asr.{class_name}'
         if lib_name not in sys.modules:
             sys.modules[lib_name] = importlib.import_module(f'{lib_name}')
-        return sys.modules[lib_name].ASRProvider(*args, **kwargs)
+        return registry.get_or_create("asr", class_name, sys.modules[lib_name].ASRProvider, *args, **kwargs)
 
     raise ValueError(f"不支持的ASR类型: {class_name}，请检查该配置的type是否设置正确")
\ No newline at end of file
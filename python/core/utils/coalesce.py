@@ -0,0 +1,25 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class RequestCoalescer:
+    """合并相同key的并发请求
+
+    同一个key正在处理时，后到的请求不再发起新的调用，而是等待第一个请求的结果。
+    实际调用作为独立的task运行，某个调用方被取消（例如客户端断开）不会影响其他等待者。
+    只能在同一个事件循环中使用，查找和登记之间没有 await，因此不需要额外加锁。
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def __len__(self):
+        return len(self._inflight)
@@ -14,6 +14,7 @@ from datetime import datetime
 from core.utils.util import is_segment
 from core.utils.util import get_string_no_punctuation_or_emoji
 from core.utils.util import read_config, get_project_dir
+from core.utils.registry import registry
 
 logger = setup_logging()
 
@@ -24,7 +25,7 @@ def create_instance(class_name, *args, **kwargs):
         lib_name = f'core.providers.llm.{class_name}.{class_name}'
         if lib_name not in sys.modules:
             sys.modules[lib_name] = importlib.import_module(f'{lib_name}')
-        return sys.modules[lib_name].LLMProvider(*args, **kwargs)
+        return registry.get_or_create("llm", class_name, sys.modules[lib_name].LLMProvider, *args, **kwargs)
 
     raise ValueError(f"不支持的LLM类型: {class_name}，请检查该配置的type是否设置正确")
 
@@ -0,0 +1,49 @@
+import json
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+from config.logger import setup_logging
+
+TAG = __name__
+logger = setup_logging()
+
+
+class ModelRegistry:
+    """模型实例注册表
+
+    按 (模块类型.类名, 配置哈希) 缓存实例，相同配置只初始化一次，
+    避免重复加载模型权重。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cache: Dict[Tuple[str, str], Any] = {}
+
+    @staticmethod
+    def make_key(kind: str, class_name: str, *args, **kwargs) -> Tuple[str, str]:
+        """根据模块类型、类名和构造参数生成缓存键"""
+        payload = json.dumps([args, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+        return f"{kind}.{class_name}", hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get_or_create(self, kind: str, class_name: str, factory: Callable[..., Any], *args, **kwargs) -> Any:
+        """返回已缓存的实例，不存在时调用 factory(*args, **kwargs) 创建并缓存"""
+        key = self.make_key(kind, class_name, *args, **kwargs)
+        with self._lock:
+            instance = self._cache.get(key)
+            if instance is None:
+                logger.bind(tag=TAG).info(f"创建实例: {key[0]}")
+                instance = factory(*args, **kwargs)
+                self._cache[key] = instance
+            else:
+                logger.bind(tag=TAG).debug(f"复用已缓存实例: {key[0]}")
+            return instance
+
+    def clear(self):
+        """清空所有缓存实例"""
+        with self._lock:
+            self._cache.clear()
+
+
+# 全局注册表
+registry = ModelRegistry()
@@ -8,6 +8,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
 
 from config.logger import setup_logging
 from core.utils.util import read_config, get_project_dir
+from core.utils.registry import registry
 
 logger = setup_logging()
 
@@ -18,7 +19,7 @@ def create_instance(class_name, *args, **kwargs):
         lib_name = f'core.providers.tts.{class_name}'
         if lib_name not in sys.modules:
             sys.modules[lib_name] = importlib.import_module(f'{lib_name}')
-        return sys.modules[lib_name].TTSProvider(*args, **kwargs)
+        return registry.get_or_create("tts", class_name, sys.modules[lib_name].TTSProvider, *args, **kwargs)
 
     raise ValueError(f"不支持的TTS类型: {class_name}，请检查该配置的type是否设置正确")
 
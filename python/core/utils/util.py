@@ -1,8 +1,10 @@
 import os
 import re
+import asyncio
 import json
 import yaml
 import socket
+import struct
 
 
 def get_project_dir():
@@ -34,50 +36,76 @@ def write_json_file(file_path, data):
         json.dump(data, file, ensure_ascii=False, indent=4)
 
 
+async def iterate_in_thread(iterator):
+    """在线程池中逐项推进同步迭代器，避免阻塞事件循环"""
+    iterator = iter(iterator)
+    sentinel = object()
+    pending = None
+    try:
+        while True:
+            # 取消只作用于等待方，正在工作线程中执行的 next() 不会被中断
+            pending = asyncio.ensure_future(asyncio.to_thread(next, iterator, sentinel))
+            item = await asyncio.shield(pending)
+            pending = None
+            if item is sentinel:
+                break
+            yield item
+    finally:
+        # 客户端提前断开时关闭生成器，确保其 finally 中的资源得到释放；
+        # 需要先等待仍在执行的 next() 结束，否则 close() 会抛出 "generator already executing"
+        if pending is not None and not pending.done():
+            await asyncio.wait({pending})
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            await asyncio.to_thread(close)
+
+
+# 分句标点，LLM输出的最后一个字符为其中之一时认为一句话结束
+SEGMENT_PUNCTUATION = frozenset((",", ".", "?", "，", "。", "？", "！", "!", ";", "；", ":", "："))
+
+# 需要从首尾去除的中英文标点（包括全角/半角）
+STRIP_PUNCTUATION = frozenset((
+    '，', ',',  # 中文逗号 + 英文逗号
+    '。', '.',  # 中文句号 + 英文句号
+    '！', '!',  # 中文感叹号 + 英文感叹号
+    '-', '－',  # 英文连字符 + 中文全角横线
+    '、'  # 中文顿号
+))
+
+# 表情符号的码点范围
+EMOJI_RANGES = (
+    (0x1F600, 0x1F64F), (0x1F300, 0x1F5FF),
+    (0x1F680, 0x1F6FF), (0x1F900, 0x1F9FF),
+    (0x1FA70, 0x1FAFF), (0x2600, 0x26FF),
+    (0x2700, 0x27BF)
+)
+
+# 导入时预先展开为完整字符集合：空白字符（最大码点为 U+3000）+ 标点 + 表情符号，逐字符判断只需一次集合查找
+STRIP_CHAR_SET = frozenset(
+    {chr(code_point) for code_point in range(0x3001) if chr(code_point).isspace()}
+    | STRIP_PUNCTUATION
+    | {chr(code_point) for start, end in EMOJI_RANGES for code_point in range(start, end + 1)}
+)
+
+
 def is_segment(tokens):
-    if len(tokens) == 0:
-        return False
-    if tokens[-1] in (",", ".", "?", "，", "。", "？", "！", "!", ";", "；", ":", "："):
-        return True
-    else:
-        return False
+    return len(tokens) > 0 and tokens[-1] in SEGMENT_PUNCTUATION
 
 
 def is_punctuation_or_emoji(char):
     """检查字符是否为空格、指定标点或表情符号"""
-    # 定义需要去除的中英文标点（包括全角/半角）
-    punctuation_set = {
-        '，', ',',  # 中文逗号 + 英文逗号
-        '。', '.',  # 中文句号 + 英文句号
-        '！', '!',  # 中文感叹号 + 英文感叹号
-        '-', '－',  # 英文连字符 + 中文全角横线
-        '、'  # 中文顿号
-    }
-    if char.isspace() or char in punctuation_set:
-        return True
-    # 检查表情符号（保留原有逻辑）
-    code_point = ord(char)
-    emoji_ranges = [
-        (0x1F600, 0x1F64F), (0x1F300, 0x1F5FF),
-        (0x1F680, 0x1F6FF), (0x1F900, 0x1F9FF),
-        (0x1FA70, 0x1FAFF), (0x2600, 0x26FF),
-        (0x2700, 0x27BF)
-    ]
-    return any(start <= code_point <= end for start, end in emoji_ranges)
+    return char in STRIP_CHAR_SET
 
 
 def get_string_no_punctuation_or_emoji(s):
     """去除字符串首尾的空格、标点符号和表情符号"""
-    chars = list(s)
-    # 处理开头的字符
     start = 0
-    while start < len(chars) and is_punctuation_or_emoji(chars[start]):
+    end = len(s)
+    while start < end and s[start] in STRIP_CHAR_SET:
         start += 1
-    # 处理结尾的字符
-    end = len(chars) - 1
-    while end >= start and is_punctuation_or_emoji(chars[end]):
+    while end > start and s[end - 1] in STRIP_CHAR_SET:
         end -= 1
-    return ''.join(chars[start:end + 1])
+    return s[start:end]
 
 
 def remove_punctuation_and_length(text):
@@ -124,3 +152,25 @@ def check_password(password):
 
     # 如果满足所有条件，则返回True
     return True
+
+
+def pack_frame(frame):
+    """为单个音频帧加上4字节小端长度前缀"""
+    return struct.pack("<I", len(frame)) + frame
+
+
+def unpack_frames(data):
+    """将长度前缀格式的二进制数据拆分为音频帧列表"""
+    frames = []
+    offset = 0
+    total = len(data)
+    while offset < total:
+        if offset + 4 > total:
+            raise ValueError(f"帧长度前缀不完整: offset={offset}, total={total}")
+        (length,) = struct.unpack_from("<I", data, offset)
+        offset += 4
+        if offset + length > total:
+            raise ValueError(f"帧数据不完整: 需要{length}字节, 剩余{total - offset}字节")
+        frames.append(data[offset:offset + length])
+        offset += length
+    return frames
@@ -5,10 +5,14 @@ import time
 import numpy as np
 import torch
 import traceback
+from core.utils.registry import registry
 
 TAG = __name__
 logger = setup_logging()
 
+# int16 PCM 归一化到 [-1, 1) 的系数
+INT16_TO_FLOAT32 = np.float32(1.0 / 32768.0)
+
 class VAD(ABC):
     @abstractmethod
     def is_vad(self, data):
@@ -19,12 +23,23 @@ class VAD(ABC):
 class SileroVAD(VAD):
     def __init__(self, config):
         logger.bind(tag=TAG).info("SileroVAD", config)
+        use_onnx = config.get("onnx", False)
+        if use_onnx:
+            try:
+                import onnxruntime  # noqa: F401
+            except ImportError:
+                logger.bind(tag=TAG).warning("未安装onnxruntime，SileroVAD回退到JIT模型")
+                use_onnx = False
+
+        # ONNX Runtime 使用CPU执行器且单线程推理，单次调用开销明显低于 eager/JIT 模式
         self.model, self.utils = torch.hub.load(repo_or_dir=config["model_dir"],
                                                 source='local',
                                                 model='silero_vad',
-                                                force_reload=False)
+                                                force_reload=False,
+                                                onnx=use_onnx,
+                                                force_onnx_cpu=True)
 
-        logger.bind(tag=TAG).info("SileroVAD model init done")
+        logger.bind(tag=TAG).info(f"SileroVAD model init done, onnx={use_onnx}")
         (get_speech_timestamps, _, _, _, _) = self.utils
 
         self.decoder = opuslib_next.Decoder(16000, 1)
@@ -55,23 +70,15 @@ class SileroVAD(VAD):
             #                           f"帧大小={self.frame_size}样本, "
             #                           f"阈值={self.vad_threshold}")
             
-            # 转换为 int16 数组
-            audio_int16 = np.frombuffer(audio_data, dtype=np.int16)
-            
-            # logger.bind(tag=TAG).debug(f"转换后样本数: {len(audio_int16)}")
-            
-            # 转换为浮点数并归一化
-            audio_float32 = audio_int16.astype(np.float32) / 32768.0
-            
-            # 转换为张量
-            audio_tensor = torch.from_numpy(audio_float32)
+            # 以 int16 视图读取原始数据（不复制），归一化时一次性得到 float32 数组
+            audio_float32 = np.frombuffer(audio_data, dtype=np.int16) * INT16_TO_FLOAT32
             
-            # 确保张量形状正确
-            if audio_tensor.ndim == 1:
-                audio_tensor = audio_tensor.unsqueeze(0)  # 添加批次维度
+            # 共享内存转换为张量并添加批次维度（均不复制数据）
+            audio_tensor = torch.from_numpy(audio_float32).unsqueeze(0)
             
-            # 检测语音活动
-            speech_prob = self.model(audio_tensor, self.sample_rate).item()
+            # 检测语音活动，推理时关闭autograd
+            with torch.inference_mode():
+                speech_prob = self.model(audio_tensor, self.sample_rate).item()
             client_have_voice = (speech_prob >= self.vad_threshold)
             
             # logger.bind(tag=TAG).debug(f"语音检测概率: {speech_prob:.4f}, 阈值: {self.vad_threshold}, 结果: {client_have_voice}")
@@ -91,5 +98,5 @@ def create_instance(class_name, *args, **kwargs) -> VAD:
     }
 
     if cls := cls_map.get(class_name):
-        return cls(*args, **kwargs)
+        return registry.get_or_create("vad", class_name, cls, *args, **kwargs)
     raise ValueError(f"不支持的SileroVAD类型: {class_name}")
\ No newline at end of file